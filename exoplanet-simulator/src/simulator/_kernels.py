@@ -0,0 +1,16 @@
+import os
+
+from numba.pycc import CC
+
+import transit_kernels
+
+cc = CC('_transit_kernels')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+cc.export('compute_orbits',
+          'Tuple((f4[:, :], f4[:, :], b1[:, :]))(f4[:], f8, f4, f8, f8, f4, f8, f4[:])')(
+    transit_kernels.compute_orbits)
+
+
+if __name__ == "__main__":
+    cc.compile()
@@ -1,63 +1,84 @@
 import PyInstaller.__main__
+import hashlib
 import os
 import shutil
 import sys
+from importlib.metadata import version
 
-if os.path.exists('dist'):
-    shutil.rmtree('dist')
-if os.path.exists('build'):
-    shutil.rmtree('build')
+release_build = bool(os.environ.get('RELEASE'))
+
+cache_key = hashlib.sha1(f"{version('matplotlib')}-{version('numpy')}-{sys.version}".encode()).hexdigest()
+workpath = os.path.join(os.path.expanduser('~'), '.cache', 'exoplanet-pyinstaller', cache_key)
+
+if release_build:
+    if os.path.exists('dist'):
+        shutil.rmtree('dist')
+    if os.path.exists(workpath):
+        shutil.rmtree(workpath)
+
+try:
+    import _kernels
+    _kernels.cc.compile()
+    aot_kernels = True
+    print("Compiled ahead-of-time kernels module")
+except Exception as e:
+    aot_kernels = False
+    print(f"Skipping ahead-of-time kernels: {e}")
 
 pyinstaller_args = [
     'exoplanet_transit_simulator.py',
     '--name=ExoplanetTransitSimulator',
-    '--onefile',
+    '--onefile' if release_build else '--onedir',
     '--windowed',
     '--icon=icon.ico',
     '--add-data=README.md:.',
     '--hidden-import=numpy',
     '--hidden-import=matplotlib',
     '--hidden-import=matplotlib.backends.backend_tkagg',
-    '--clean',
+    '--exclude-module=tkinter.test',
+    '--exclude-module=matplotlib.tests',
+    '--exclude-module=numpy.testing',
+    '--exclude-module=numpy.f2py',
+    '--exclude-module=numpy.distutils',
+    '--exclude-module=scipy',
+    '--exclude-module=pandas',
+    '--exclude-module=IPython',
+    '--optimize=2',
+    f'--workpath={workpath}',
     '--noconfirm',
 ]
 
-PyInstaller.__main__.run(pyinstaller_args)
-
-print("PyInstaller build completed!")
+if aot_kernels:
+    pyinstaller_args += ['--exclude-module=numba', '--exclude-module=llvmlite']
+else:
+    pyinstaller_args.append('--hidden-import=numba')
 
-if not os.path.exists('icon.ico'):
+if not os.path.exists('icon.ico') or os.path.getsize('icon.ico') == 0:
     try:
-        import matplotlib.pyplot as plt
-        import numpy as np
-        from matplotlib.patches import Circle
-        
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.set_aspect('equal')
-        ax.set_xlim(-1.2, 1.2)
-        ax.set_ylim(-1.2, 1.2)
-        ax.axis('off')
-        
-        star = Circle((0, 0), 0.5, color='orange')
-        ax.add_patch(star)
+        from PIL import Image, ImageDraw
         
-        planet = Circle((0.8, 0), 0.2, color='blue')
-        ax.add_patch(planet)
-        
-        plt.savefig('icon.png', dpi=100, bbox_inches='tight', transparent=True)
-        plt.close()
-        
-        from PIL import Image
-        img = Image.open('icon.png')
-        img.save('icon.ico')
-        os.remove('icon.png')
+        img = Image.new('RGBA', (256, 256), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        draw.ellipse((64, 64, 192, 192), fill='orange')
+        draw.ellipse((176, 112, 224, 160), fill='blue')
+        img.save('icon.ico', sizes=[(256, 256), (128, 128), (64, 64), (32, 32), (16, 16)])
         print("Created icon.ico")
     except Exception as e:
         print(f"Could not create icon: {e}")
         with open('icon.ico', 'wb') as f:
             f.write(b'')
 
+PyInstaller.__main__.run(pyinstaller_args)
+
+print("PyInstaller build completed!")
+
 if sys.platform.startswith('win'):
+    if release_build:
+        inno_files = 'Source: "dist\\ExoplanetTransitSimulator.exe"; DestDir: "{app}"; Flags: ignoreversion'
+    else:
+        inno_files = ('Source: "dist\\ExoplanetTransitSimulator\\*"; DestDir: "{app}"; '
+                      'Flags: ignoreversion recursesubdirs createallsubdirs')
+    
     inno_script = """
 [Setup]
 AppName=Exoplanet Transit Simulator
@@ -65,13 +86,16 @@ AppVersion=1.0
 DefaultDirName={autopf}\\ExoplanetTransitSimulator
 DefaultGroupName=Exoplanet Transit Simulator
 UninstallDisplayIcon={app}\\ExoplanetTransitSimulator.exe
-Compression=lzma2
+Compression=lzma2/max
 SolidCompression=yes
+LZMAUseSeparateProcess=yes
+LZMANumBlockThreads=6
+LZMADictionarySize=65536
 OutputDir=.
 OutputBaseFilename=ExoplanetTransitSimulator_Setup
 
 [Files]
-Source: "dist\\ExoplanetTransitSimulator.exe"; DestDir: "{app}"; Flags: ignoreversion
+{inno_files}
 
 [Icons]
 Name: "{group}\\Exoplanet Transit Simulator"; Filename: "{app}\\ExoplanetTransitSimulator.exe"
@@ -79,7 +103,7 @@ Name: "{commondesktop}\\Exoplanet Transit Simulator"; Filename: "{app}\\Exoplane
     """
     
     with open('installer_script.iss', 'w') as f:
-        f.write(inno_script)
+        f.write(inno_script.replace('{inno_files}', inno_files))
     
     print("Created Inno Setup script (installer_script.iss)")
     print("To create the installer, run Inno Setup Compiler with this script")
@@ -1,10 +1,70 @@
+import os
+import subprocess
+import sys
+import warnings
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-from matplotlib.patches import Circle, Rectangle, FancyArrowPatch
+from matplotlib.patches import Circle, FancyArrowPatch
 from matplotlib.gridspec import GridSpec
 import matplotlib.colors as colors
 from matplotlib.collections import LineCollection
+from matplotlib.transforms import Affine2D, Bbox, TransformedBbox
+
+RAY_COLOR = colors.to_rgba('yellow', 0.7)
+BLOCKED_RAY_COLOR = (0.0, 0.0, 0.0, 0.0)
+
+try:
+    import _transit_kernels
+except ImportError:
+    _transit_kernels = None
+
+_KERNEL_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'transit_kernels.py')
+if (_transit_kernels is not None and os.path.exists(_KERNEL_SOURCE)
+        and os.path.getmtime(_KERNEL_SOURCE) > os.path.getmtime(_transit_kernels.__file__)):
+    warnings.warn("_transit_kernels is older than transit_kernels.py, rebuild it with _kernels.py; "
+                  "falling back to the JIT kernel")
+    _transit_kernels = None
+
+if _transit_kernels is not None:
+    _compute_orbits = _transit_kernels.compute_orbits
+else:
+    try:
+        from numba import njit
+        import transit_kernels
+        _compute_orbits = njit(parallel=True, fastmath=True,
+                               cache=not getattr(sys, 'frozen', False))(transit_kernels.compute_orbits)
+    except (ImportError, RuntimeError):
+        _compute_orbits = None
+
+
+def _has_nvenc():
+    try:
+        result = subprocess.run([animation.FFMpegWriter.bin_path(), '-hide_banner', '-loglevel', 'error',
+                                 '-f', 'lavfi', '-i', 'nullsrc=s=256x256:d=0.1',
+                                 '-c:v', 'h264_nvenc', '-preset', 'p4', '-f', 'null', '-'],
+                                capture_output=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.returncode == 0
+
+
+def _overlap_area(d, R, r):
+    d = np.asarray(d, dtype=np.float64)
+    area = np.zeros_like(d)
+    
+    inside = d <= abs(R - r)
+    area[inside] = np.pi * min(R, r)**2
+    
+    partial = (d > abs(R - r)) & (d < R + r)
+    dp = d[partial]
+    cos_R = np.clip((dp**2 + R**2 - r**2) / (2 * dp * R), -1.0, 1.0)
+    cos_r = np.clip((dp**2 + r**2 - R**2) / (2 * dp * r), -1.0, 1.0)
+    kite = np.sqrt(np.clip((-dp + R + r) * (dp + R - r) * (dp - R + r) * (dp + R + r), 0.0, None))
+    area[partial] = R**2 * np.arccos(cos_R) + r**2 * np.arccos(cos_r) - 0.5 * kite
+    
+    return area
+
 
 class ExoplanetSystem:
     def __init__(self):
@@ -21,62 +81,133 @@ class ExoplanetSystem:
         
         self.days_to_simulate = 14
         self.time_resolution = 200
+        self.coarse_time_resolution = 10
+        self.adaptive_sampling = False
         
-        self.time_points = np.linspace(0, self.days_to_simulate, 
-                                      self.days_to_simulate * self.time_resolution)
+        self.num_rays = 15
         
-        self.calculate_positions()
+        self.simulate()
+    
+    def simulate(self):
+        self.time_points = self.build_time_grid()
+        self.ray_positions = np.linspace(-self.star_radius * 0.9, self.star_radius * 0.9, self.num_rays,
+                                         dtype=np.float32)
+        
+        if _compute_orbits is not None:
+            self.calculate_orbits()
+        else:
+            self.calculate_positions()
+            self.calculate_light_rays()
         self.calculate_light_curve()
-        self.calculate_light_rays()
+    
+    def transit_windows(self, semi_major_axis, period, radius):
+        half_width = np.arccos(min((self.star_radius + radius) / semi_major_axis, 1.0))
+        omega = 2 * np.pi / period
+        
+        windows = []
+        for k in range(int(self.days_to_simulate // period) + 1):
+            t_start = (np.pi + half_width) / omega + k * period
+            t_end = (2 * np.pi - half_width) / omega + k * period
+            if t_start < self.days_to_simulate and t_end > 0:
+                windows.append((t_start, t_end))
+        return windows
+    
+    def build_time_grid(self):
+        if not self.adaptive_sampling:
+            return np.linspace(0, self.days_to_simulate, 
+                               self.days_to_simulate * self.time_resolution, dtype=np.float32)
+        
+        windows = (self.transit_windows(self.planet1_semi_major_axis, self.planet1_period, self.planet1_radius) +
+                   self.transit_windows(self.planet2_semi_major_axis, self.planet2_period, self.planet2_radius))
+        edges = sorted({0.0, float(self.days_to_simulate)} |
+                       {min(max(t, 0.0), self.days_to_simulate) for window in windows for t in window})
+        
+        segments = []
+        for t_start, t_end in zip(edges[:-1], edges[1:]):
+            t_mid = 0.5 * (t_start + t_end)
+            in_transit = any(w_start <= t_mid <= w_end for w_start, w_end in windows)
+            resolution = self.time_resolution if in_transit else self.coarse_time_resolution
+            n_samples = max(int(np.ceil((t_end - t_start) * resolution)), 1)
+            segments.append(np.linspace(t_start, t_end, n_samples, endpoint=False))
+        segments.append([self.days_to_simulate])
+        
+        return np.concatenate(segments).astype(np.float32)
     
     def calculate_positions(self):
-        omega1 = 2 * np.pi / self.planet1_period
-        omega2 = 2 * np.pi / self.planet2_period
+        omega1 = np.float32(2 * np.pi / self.planet1_period)
+        omega2 = np.float32(2 * np.pi / self.planet2_period)
         
-        self.planet1_x = self.planet1_semi_major_axis * np.cos(omega1 * self.time_points)
-        self.planet1_y = self.planet1_semi_major_axis * np.sin(omega1 * self.time_points)
+        phase1 = omega1 * self.time_points
+        phase2 = omega2 * self.time_points
         
-        self.planet2_x = self.planet2_semi_major_axis * np.cos(omega2 * self.time_points)
-        self.planet2_y = self.planet2_semi_major_axis * np.sin(omega2 * self.time_points)
+        self.planet1_xy = np.empty((len(self.time_points), 2), dtype=np.float32)
+        np.cos(phase1, out=self.planet1_xy[:, 0])
+        np.sin(phase1, out=self.planet1_xy[:, 1])
+        self.planet1_xy *= self.planet1_semi_major_axis
+        
+        self.planet2_xy = np.empty((len(self.time_points), 2), dtype=np.float32)
+        np.cos(phase2, out=self.planet2_xy[:, 0])
+        np.sin(phase2, out=self.planet2_xy[:, 1])
+        self.planet2_xy *= self.planet2_semi_major_axis
+        
+        self.split_positions()
     
     def calculate_light_curve(self):
-        self.light_curve = np.ones_like(self.time_points)
+        self.light_curve = np.ones_like(self.time_points, dtype=np.float32)
         
-        for i, t in enumerate(self.time_points):
-            if abs(self.planet1_x[i]) < self.star_radius and self.planet1_y[i] < 0:
-                blocked_area1 = np.pi * self.planet1_radius**2
-                self.light_curve[i] -= blocked_area1 / (np.pi * self.star_radius**2)
-            
-            if abs(self.planet2_x[i]) < self.star_radius and self.planet2_y[i] < 0:
-                blocked_area2 = np.pi * self.planet2_radius**2
-                self.light_curve[i] -= blocked_area2 / (np.pi * self.star_radius**2)
+        star_area = np.pi * self.star_radius**2
         
-        self.light_curve = np.maximum(self.light_curve, 0)
+        planets = ((self.planet1_radius, self.planet1_semi_major_axis, self.planet1_period, self.planet1_x),
+                   (self.planet2_radius, self.planet2_semi_major_axis, self.planet2_period, self.planet2_x))
+        for radius, semi_major_axis, period, planet_x in planets:
+            for t_start, t_end in self.transit_windows(semi_major_axis, period, radius):
+                i_start = np.searchsorted(self.time_points, t_start, side='right')
+                i_end = np.searchsorted(self.time_points, t_end, side='left')
+                overlap = _overlap_area(np.abs(planet_x[i_start:i_end]), self.star_radius, radius)
+                self.light_curve[i_start:i_end] -= overlap / star_area
+        
+        np.clip(self.light_curve, 0.0, None, out=self.light_curve)
+    
+    def calculate_orbits(self):
+        omega1 = np.float32(2 * np.pi / self.planet1_period)
+        omega2 = np.float32(2 * np.pi / self.planet2_period)
+        
+        self.planet1_xy, self.planet2_xy, self.ray_visibility = _compute_orbits(
+            self.time_points,
+            self.planet1_semi_major_axis, omega1, self.planet1_radius,
+            self.planet2_semi_major_axis, omega2, self.planet2_radius,
+            self.ray_positions)
+        self.split_positions()
+        self.calculate_ray_state_change()
+    
+    def split_positions(self):
+        self.planet1_x = self.planet1_xy[:, 0]
+        self.planet1_y = self.planet1_xy[:, 1]
+        self.planet2_x = self.planet2_xy[:, 0]
+        self.planet2_y = self.planet2_xy[:, 1]
     
     def calculate_light_rays(self):
-        self.num_rays = 15
-        
-        ray_positions = np.linspace(-self.star_radius * 0.9, self.star_radius * 0.9, self.num_rays)
+        r1_sq = self.planet1_radius**2
+        r2_sq = self.planet2_radius**2
         
-        self.ray_visibility = np.ones((len(self.time_points), self.num_rays))
+        d1 = self.ray_positions[None, :] - self.planet1_x[:, None]
+        d2 = self.ray_positions[None, :] - self.planet2_x[:, None]
         
-        for i, t in enumerate(self.time_points):
-            for j, ray_pos in enumerate(ray_positions):
-                if (self.planet1_y[i] < 0 and 
-                    abs(ray_pos - self.planet1_x[i]) < self.planet1_radius):
-                    self.ray_visibility[i, j] = 0
-                
-                if (self.planet2_y[i] < 0 and 
-                    abs(ray_pos - self.planet2_x[i]) < self.planet2_radius):
-                    self.ray_visibility[i, j] = 0
+        blocked1 = (d1 * d1 < r1_sq) & (self.planet1_y < 0)[:, None]
+        blocked2 = (d2 * d2 < r2_sq) & (self.planet2_y < 0)[:, None]
         
-        self.ray_positions = ray_positions
+        self.ray_visibility = ~(blocked1 | blocked2)
+        self.calculate_ray_state_change()
+    
+    def calculate_ray_state_change(self):
+        self.ray_state_change = np.diff(self.ray_visibility, axis=0,
+                                        prepend=self.ray_visibility[-1:]).any(axis=1)
 
 
 class ExoplanetTransitVisualizer:
     def __init__(self, exoplanet_system):
-        self.system = exoplanet_system
         self.setup_figure()
+        self.update_static_data(exoplanet_system)
         
     def setup_figure(self):
         self.fig = plt.figure(figsize=(14, 10))
@@ -92,25 +223,23 @@ class ExoplanetTransitVisualizer:
         self.ax_system.grid(True, linestyle='--', alpha=0.7)
         
         star_cmap = colors.LinearSegmentedColormap.from_list('star_cmap', ['#FFFF00', '#FFA500'])
-        self.star = Circle((0, 0), self.system.star_radius, color=star_cmap(0.5), zorder=1)
+        self.star = Circle((0, 0), 1.0, color=star_cmap(0.5), zorder=1)
         self.ax_system.add_patch(self.star)
         
         planet1_cmap = colors.LinearSegmentedColormap.from_list('planet1_cmap', ['#0077BE', '#00BFFF'])
         planet2_cmap = colors.LinearSegmentedColormap.from_list('planet2_cmap', ['#8B0000', '#FF4500'])
         
-        self.planet1 = Circle((0, 0), self.system.planet1_radius, color=planet1_cmap(0.5), zorder=3)
-        self.planet2 = Circle((0, 0), self.system.planet2_radius, color=planet2_cmap(0.5), zorder=3)
+        self.planet1 = Circle((0, 0), 0.01, color=planet1_cmap(0.5), zorder=3)
+        self.planet2 = Circle((0, 0), 0.01, color=planet2_cmap(0.5), zorder=3)
+        self._planet1_trans = Affine2D()
+        self._planet2_trans = Affine2D()
+        self.planet1.set_transform(self._planet1_trans + self.ax_system.transData)
+        self.planet2.set_transform(self._planet2_trans + self.ax_system.transData)
         self.ax_system.add_patch(self.planet1)
         self.ax_system.add_patch(self.planet2)
         
-        self.rays = []
-        for i in range(self.system.num_rays):
-            ray_x = self.system.ray_positions[i]
-            ray = FancyArrowPatch((ray_x, 0), (ray_x, -0.7), 
-                                 color='yellow', alpha=0.7, linewidth=1.5,
-                                 arrowstyle='->', mutation_scale=15, zorder=0)
-            self.ax_system.add_patch(ray)
-            self.rays.append(ray)
+        self.rays_coll = LineCollection([], colors=[RAY_COLOR], linewidths=1.5, zorder=0)
+        self.ax_system.add_collection(self.rays_coll)
         
         observer_x = 0
         observer_y = -0.75
@@ -119,29 +248,24 @@ class ExoplanetTransitVisualizer:
         self.ax_system.text(observer_x, observer_y - 0.1, 'Observer', 
                            ha='center', va='top', fontsize=10)
         
-        orbit_arrow1 = FancyArrowPatch((self.system.planet1_semi_major_axis + 0.1, 0), 
-                                      (self.system.planet1_semi_major_axis + 0.1, 0.2), 
-                                      color='blue', arrowstyle='->', mutation_scale=15)
-        orbit_arrow2 = FancyArrowPatch((self.system.planet2_semi_major_axis + 0.1, 0), 
-                                      (self.system.planet2_semi_major_axis + 0.1, 0.2), 
-                                      color='red', arrowstyle='->', mutation_scale=15)
-        self.ax_system.add_patch(orbit_arrow1)
-        self.ax_system.add_patch(orbit_arrow2)
+        self.orbit_arrow1 = FancyArrowPatch((0, 0), (0, 0.2), color='blue', arrowstyle='->', mutation_scale=15)
+        self.orbit_arrow2 = FancyArrowPatch((0, 0), (0, 0.2), color='red', arrowstyle='->', mutation_scale=15)
+        self.ax_system.add_patch(self.orbit_arrow1)
+        self.ax_system.add_patch(self.orbit_arrow2)
         
         self.ax_light = self.fig.add_subplot(gs[1])
-        self.ax_light.set_xlim(0, self.system.days_to_simulate)
-        self.ax_light.set_ylim(0.995, 1.001)
         self.ax_light.set_title('Light Curve (Photometric Data)', fontsize=14)
         self.ax_light.set_xlabel('Time (days)', fontsize=12)
         self.ax_light.set_ylabel('Relative Brightness', fontsize=12)
         self.ax_light.grid(True, linestyle='--', alpha=0.7)
         
         self.light_line, = self.ax_light.plot([], [], 'k-', lw=2)
+        self._light_clip = Bbox([[0, 0], [0, 1]])
+        self.light_line.set_clip_box(TransformedBbox(self._light_clip, self.ax_light.get_xaxis_transform()))
         
         self.time_line = self.ax_light.axvline(x=0, color='r', linestyle='-', alpha=0.7)
         
         self.ax_events = self.fig.add_subplot(gs[2])
-        self.ax_events.set_xlim(0, self.system.days_to_simulate)
         self.ax_events.set_ylim(0, 1)
         self.ax_events.set_title('Transit Events Timeline', fontsize=14)
         self.ax_events.set_xlabel('Time (days)', fontsize=12)
@@ -149,21 +273,8 @@ class ExoplanetTransitVisualizer:
         self.ax_events.set_yticklabels(['Planet 2', 'Planet 1'])
         self.ax_events.grid(True, linestyle='--', alpha=0.7)
         
-        self.transit_markers1 = []
-        self.transit_markers2 = []
-        
-        for i, t in enumerate(self.system.time_points):
-            if (abs(self.system.planet1_x[i]) < self.system.star_radius and 
-                self.system.planet1_y[i] < 0):
-                rect = Rectangle((t, 0.7), 0.01, 0.1, color='blue', alpha=0.5)
-                self.ax_events.add_patch(rect)
-                self.transit_markers1.append(rect)
-            
-            if (abs(self.system.planet2_x[i]) < self.system.star_radius and 
-                self.system.planet2_y[i] < 0):
-                rect = Rectangle((t, 0.2), 0.01, 0.1, color='red', alpha=0.5)
-                self.ax_events.add_patch(rect)
-                self.transit_markers2.append(rect)
+        self.transit_bars1 = None
+        self.transit_bars2 = None
         
         self.event_time_line = self.ax_events.axvline(x=0, color='r', linestyle='-', alpha=0.7)
         
@@ -173,58 +284,118 @@ class ExoplanetTransitVisualizer:
         
         self.ax_system.text(1.3, -0.6, 'Light Rays', color='yellow', fontsize=10, 
                            ha='center', bbox=dict(facecolor='black', alpha=0.5))
+    
+    def update_static_data(self, exoplanet_system):
+        self.system = exoplanet_system
+        
+        self.star.set_radius(self.system.star_radius)
+        self.planet1.set_radius(self.system.planet1_radius)
+        self.planet2.set_radius(self.system.planet2_radius)
+        
+        ray_x = self.system.ray_positions
+        segments = np.stack([np.stack([ray_x, np.zeros_like(ray_x)], axis=1),
+                             np.stack([ray_x, np.full_like(ray_x, -0.7)], axis=1)], axis=1)
+        self.rays_coll.set_segments(segments)
+        
+        self.orbit_arrow1.set_positions((self.system.planet1_semi_major_axis + 0.1, 0), 
+                                        (self.system.planet1_semi_major_axis + 0.1, 0.2))
+        self.orbit_arrow2.set_positions((self.system.planet2_semi_major_axis + 0.1, 0), 
+                                        (self.system.planet2_semi_major_axis + 0.1, 0.2))
+        
+        self.ax_light.set_xlim(0, self.system.days_to_simulate)
+        self.ax_light.set_ylim(min(0.995, self.system.light_curve.min() - 0.001), 1.001)
+        self.ax_events.set_xlim(0, self.system.days_to_simulate)
+        self.light_line.set_data(self.system.time_points, self.system.light_curve)
+        
+        windows1 = self.system.transit_windows(self.system.planet1_semi_major_axis, self.system.planet1_period,
+                                               self.system.planet1_radius)
+        windows2 = self.system.transit_windows(self.system.planet2_semi_major_axis, self.system.planet2_period,
+                                               self.system.planet2_radius)
+        
+        if self.transit_bars1 is not None:
+            self.transit_bars1.remove()
+            self.transit_bars2.remove()
+        self.transit_bars1 = self.ax_events.broken_barh([(t_start, t_end - t_start) for t_start, t_end in windows1],
+                                                        (0.7, 0.1), color='blue', alpha=0.5)
+        self.transit_bars2 = self.ax_events.broken_barh([(t_start, t_end - t_start) for t_start, t_end in windows2],
+                                                        (0.2, 0.1), color='red', alpha=0.5)
         
         self.fig.tight_layout()
+        self.precompute_frames()
+    
+    def precompute_frames(self):
+        self._planet1_centers = list(map(tuple, self.system.planet1_xy.tolist()))
+        self._planet2_centers = list(map(tuple, self.system.planet2_xy.tolist()))
+        self._frame_times = self.system.time_points.tolist()
+        
+        self._ray_colors = np.empty(self.system.ray_visibility.shape + (4,), dtype=np.float32)
+        self._ray_colors[:] = BLOCKED_RAY_COLOR
+        self._ray_colors[self.system.ray_visibility] = RAY_COLOR
     
     def init_animation(self):
-        self.planet1.center = (0, 0)
-        self.planet2.center = (0, 0)
-        self.light_line.set_data([], [])
-        self.time_line.set_xdata(0)
-        self.event_time_line.set_xdata(0)
+        self._planet1_trans.clear()
+        self._planet2_trans.clear()
+        self._light_clip.x1 = 0
+        self.time_line.set_xdata([0, 0])
+        self.event_time_line.set_xdata([0, 0])
         
-        for ray in self.rays:
-            ray.set_visible(True)
+        self.rays_coll.set_color(RAY_COLOR)
+        self._rays_stale = True
         
         return [self.planet1, self.planet2, self.light_line, 
-                self.time_line, self.event_time_line] + self.rays
+                self.time_line, self.event_time_line, self.rays_coll]
     
-    def animate(self, i):
+    def bind_animate(self):
         n_frames = len(self.system.time_points)
-        i = i % n_frames
-        
-        self.planet1.center = (self.system.planet1_x[i], self.system.planet1_y[i])
-        self.planet2.center = (self.system.planet2_x[i], self.system.planet2_y[i])
-        
-        if i == 0:
-            self.light_line.set_data([], [])
-        else:
-            self.light_line.set_data(self.system.time_points[:i+1], self.system.light_curve[:i+1])
-        
-        current_time = self.system.time_points[i]
-        self.time_line.set_xdata(current_time)
-        self.event_time_line.set_xdata(current_time)
-        
-        for j, ray in enumerate(self.rays):
-            ray.set_visible(bool(self.system.ray_visibility[i, j]))
+        planet1_centers = self._planet1_centers
+        planet2_centers = self._planet2_centers
+        frame_times = self._frame_times
+        ray_state_change = self.system.ray_state_change
+        ray_colors = self._ray_colors
+        
+        planet1_trans = self._planet1_trans
+        planet2_trans = self._planet2_trans
+        light_clip = self._light_clip
+        set_time_line = self.time_line.set_xdata
+        set_event_time_line = self.event_time_line.set_xdata
+        set_ray_colors = self.rays_coll.set_color
+        
+        artists = [self.planet1, self.planet2, self.light_line, 
+                   self.time_line, self.event_time_line, self.rays_coll]
+        
+        def animate(i):
+            i = i % n_frames
             
-            if self.system.ray_visibility[i, j]:
-                ray.set_color('yellow')
-            else:
-                ray.set_color('red')
+            planet1_trans.clear().translate(*planet1_centers[i])
+            planet2_trans.clear().translate(*planet2_centers[i])
+            
+            current_time = frame_times[i]
+            light_clip.x1 = current_time
+            set_time_line([current_time, current_time])
+            set_event_time_line([current_time, current_time])
+            
+            if self._rays_stale or ray_state_change[i]:
+                set_ray_colors(ray_colors[i])
+                self._rays_stale = False
+            
+            return artists
         
-        return [self.planet1, self.planet2, self.light_line, 
-                self.time_line, self.event_time_line] + self.rays
+        return animate
     
     def create_animation(self, save_path=None):
         n_frames = len(self.system.time_points)
         
-        ani = animation.FuncAnimation(self.fig, self.animate, frames=n_frames,
+        ani = animation.FuncAnimation(self.fig, self.bind_animate(), frames=n_frames,
                                      init_func=self.init_animation, blit=True, 
-                                     interval=10)
+                                     interval=10, cache_frame_data=False)
         
         if save_path:
-            ani.save(save_path, writer='ffmpeg', fps=60)
+            if _has_nvenc():
+                writer = animation.FFMpegWriter(fps=60, codec='h264_nvenc', bitrate=4000,
+                                                extra_args=['-preset', 'p4', '-pix_fmt', 'yuv420p'])
+            else:
+                writer = animation.FFMpegWriter(fps=60, codec='h264', bitrate=4000)
+            ani.save(save_path, writer=writer, dpi=100)
             print(f"Animation saved to {save_path}")
         
         plt.show()
@@ -0,0 +1,38 @@
+import numpy as np
+
+try:
+    from numba import prange
+except ImportError:
+    prange = range
+
+
+def compute_orbits(time_points, a1, omega1, r1, a2, omega2, r2, ray_positions):
+    r1_sq = r1 * r1
+    r2_sq = r2 * r2
+    
+    planet1_xy = np.empty((time_points.shape[0], 2), dtype=time_points.dtype)
+    planet2_xy = np.empty((time_points.shape[0], 2), dtype=time_points.dtype)
+    ray_visibility = np.ones((time_points.shape[0], ray_positions.shape[0]), dtype=np.bool_)
+    
+    for i in prange(time_points.shape[0]):
+        phase1 = omega1 * time_points[i]
+        phase2 = omega2 * time_points[i]
+        x1 = a1 * np.cos(phase1)
+        y1 = a1 * np.sin(phase1)
+        x2 = a2 * np.cos(phase2)
+        y2 = a2 * np.sin(phase2)
+        planet1_xy[i, 0] = x1
+        planet1_xy[i, 1] = y1
+        planet2_xy[i, 0] = x2
+        planet2_xy[i, 1] = y2
+        
+        for j in range(ray_positions.shape[0]):
+            d1 = ray_positions[j] - x1
+            d2 = ray_positions[j] - x2
+            if y1 < 0 and d1 * d1 < r1_sq:
+                ray_visibility[i, j] = False
+            if y2 < 0 and d2 * d2 < r2_sq:
+                ray_visibility[i, j] = False
+    
+    return planet1_xy, planet2_xy, ray_visibility
+